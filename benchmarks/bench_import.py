@@ -0,0 +1,128 @@
+"""
+导入耗时基准测试。
+
+在独立的子进程中导入包内的每个模块，记录导入耗时，并检查是否导入了不相关的重型依赖。
+如果某个模块导入了禁止的依赖，或耗时超过阈值，以非零状态码退出。
+
+用法：python benchmarks/bench_import.py [--repeat 5] [--max-seconds 1.0] [--output result.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PARENT_DIR = os.path.dirname(_REPO_DIR)
+_PACKAGE_NAME = os.path.basename(_REPO_DIR)
+
+# 导入这些模块时不允许加载的依赖
+HEAVY_MODULES = ['torch', 'numpy', 'pandas', 'tqdm']
+
+FORBIDDEN_MODULES = {
+    'datetime_util': HEAVY_MODULES,
+    'logging_util': HEAVY_MODULES,
+    'json_util': HEAVY_MODULES,
+    'es_util': HEAVY_MODULES + ['pymongo', 'pymysql'],
+    'mysql_util': HEAVY_MODULES + ['pymongo', 'requests'],
+    'db_util': HEAVY_MODULES + ['pymongo', 'pymysql', 'requests'],
+    'lazy_util': HEAVY_MODULES,
+    'thread_util': HEAVY_MODULES,
+    'torch_imports': HEAVY_MODULES,
+    'torch_util': HEAVY_MODULES,
+    'sync_util': HEAVY_MODULES + ['pymongo'],
+}
+
+_CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {package}.{module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def _missing_dependency(stderr: str) -> str:
+    """
+    如果子进程因为缺少第三方依赖而失败，返回依赖的名称，否则返回空字符串。
+    """
+    match = re.search(r"^ModuleNotFoundError: No module named '([^']+)'", stderr, flags=re.MULTILINE)
+
+    if not match:
+        return ''
+
+    name = match.group(1)
+    if name.split('.')[0] == _PACKAGE_NAME:
+        return ''
+
+    return name
+
+
+def measure_import(module: str) -> dict:
+    """
+    在全新的解释器中导入模块，返回导入耗时以及导入后sys.modules中的模块列表。
+    """
+    code = _CHILD_CODE.format(package=_PACKAGE_NAME, module=module)
+    output = subprocess.run([sys.executable, '-c', code],
+                            cwd=_PARENT_DIR,
+                            check=True,
+                            capture_output=True,
+                            text=True).stdout
+
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=1.0)
+    parser.add_argument('--output', type=str, default='')
+    args = parser.parse_args()
+
+    results = []
+    failed = False
+
+    for module, forbidden in FORBIDDEN_MODULES.items():
+        try:
+            runs = [measure_import(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            dependency = _missing_dependency(e.stderr)
+
+            if dependency:
+                # 模块自身的第三方依赖没有安装，跳过
+                print(f"{module}: skipped (missing dependency: {dependency})")
+            else:
+                # 模块本身导入失败（语法错误、错误的相对导入等）
+                print(f"{module}: import failed  [FAIL]\n{e.stderr.strip()}")
+                failed = True
+                results.append({'module': module, 'error': e.stderr.strip().splitlines()[-1], 'ok': False})
+            continue
+
+        seconds = sorted(run['seconds'] for run in runs)
+        loaded = sorted(set(forbidden) & set(runs[0]['modules']))
+        median = seconds[len(seconds) // 2]
+        ok = not loaded and median <= args.max_seconds
+        failed = failed or not ok
+
+        results.append({
+            'module': module,
+            'median_seconds': median,
+            'min_seconds': seconds[0],
+            'forbidden_loaded': loaded,
+            'ok': ok,
+        })
+        print(f"{module}: median {median * 1000:.1f} ms, min {seconds[0] * 1000:.1f} ms"
+              + (f", loaded {loaded}" if loaded else '')
+              + ('' if ok else '  [FAIL]'))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=2)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
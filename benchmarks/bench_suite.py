@@ -0,0 +1,382 @@
+"""
+基准测试套件。
+
+使用本地替身（见stubs.py）测量包内各个I/O与计算路径的吞吐量和延迟，结果以JSON格式输出，便于在不同提交之间比较。
+
+用法：
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+
+可以通过--only指定只运行名称中包含某个子串的用例。
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+import typing
+
+import stubs
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_PACKAGE_NAME = os.path.basename(_REPO_DIR)
+sys.path.insert(0, os.path.dirname(_REPO_DIR))
+
+
+def _import(module: str):
+    return importlib.import_module(f'{_PACKAGE_NAME}.{module}')
+
+
+class BenchResult(typing.NamedTuple):
+    name: str
+    ops: int
+    items: int
+    seconds: float
+    ops_per_sec: float
+    items_per_sec: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+def measure(name: str, fn: typing.Callable[[], typing.Any], repeat: int, items_per_op: int = 1, warmup: int = 1) -> BenchResult:
+    """
+    重复调用fn，记录每次调用的延迟。items_per_op表示每次调用处理的条目数，用于计算条目吞吐量。
+    """
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    return BenchResult(
+        name=name,
+        ops=repeat,
+        items=repeat * items_per_op,
+        seconds=seconds,
+        ops_per_sec=repeat / seconds,
+        items_per_sec=repeat * items_per_op / seconds,
+        p50_ms=latencies[len(latencies) // 2] * 1000,
+        p95_ms=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        max_ms=latencies[-1] * 1000,
+    )
+
+
+# ==========用例==========
+
+def _make_doc(i: int) -> dict:
+    return {
+        'id': i,
+        'title': f'title-{i}',
+        'score': random.random(),
+        'tags': ['a', 'b', 'c'][: i % 3 + 1],
+        'created_at': f'2022-02-{i % 28 + 1:02d} 18:46:27',
+    }
+
+
+def bench_es(scale: int) -> list[BenchResult]:
+    es_util = _import('es_util')
+    results = []
+
+    with stubs.EsStubServer() as server:
+        index = es_util.EsClient(server.host).get_index('bench')
+        index.create_mapping({'title': {'type': 'text_keyword'}, 'score': {'type': 'float'}}, delete_index=True)
+
+        # ES的_id不能为0
+        counter = iter(range(1, 10 ** 9))
+        results.append(measure('es.save_one', lambda: index.save_one(_make_doc(next(counter))), repeat=scale))
+        results.append(measure('es.insert_one', lambda: index.insert_one({'title': 'x', 'score': 1.0}), repeat=scale // 4))
+        results.append(measure('es.get_by_id', lambda: index.get_by_id(random.randrange(1, scale + 1)), repeat=scale))
+        results.append(measure('es.count', lambda: index.count(), repeat=scale // 4))
+        results.append(measure('es.query_by_field',
+                               lambda: index.query_by_field('title', f'title-{random.randrange(scale)}', method='term'),
+                               repeat=scale // 4))
+
+        def _session_save():
+            with index.write_session(batch_size=100) as session:
+                for _ in range(100):
+                    session.save_one(_make_doc(next(counter)), refresh=True)
+                session.wait_visible()
+
+        results.append(measure('es.write_session.save_one(refresh)', _session_save, repeat=5, items_per_op=100))
+        results.append(measure('es.save_one(refresh)', lambda: index.save_one(_make_doc(next(counter)), refresh=True),
+                               repeat=scale // 4))
+
+        num_docs = index.count()
+        results.append(measure('es.get_all', lambda: sum(1 for _ in index.get_all(page_size=500)),
+                               repeat=5, items_per_op=num_docs))
+
+        copy_counter = iter(range(10 ** 9))
+        results.append(measure('es.copy_to(transform)',
+                               lambda: index.copy_to(f'bench-copy-{next(copy_counter)}', transform=lambda e: e, page_size=500),
+                               repeat=3, items_per_op=num_docs))
+
+    return results
+
+
+def bench_mysql(scale: int) -> list[BenchResult]:
+    mysql_util = _import('mysql_util')
+    conn = stubs.SQLiteConnection()
+    conn.cursor().execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, title TEXT, score REAL, created_at TEXT)')
+    table = mysql_util.MySQLTable(conn=conn, table_name='bench')
+
+    def _row(i: int) -> dict:
+        doc = _make_doc(i)
+        return {'id': doc['id'], 'title': doc['title'], 'score': doc['score'], 'created_at': doc['created_at']}
+
+    counter = iter(range(10 ** 9))
+    results = [
+        measure('mysql.insert_one', lambda: table.insert_one(_row(next(counter))), repeat=scale, warmup=0),
+        measure('mysql.get_by_id', lambda: table.get_by_id(random.randrange(scale)), repeat=scale),
+        measure('mysql.save_one', lambda: table.save_one(_row(random.randrange(scale))), repeat=scale),
+        measure('mysql.update_one', lambda: table.update_one({'id': random.randrange(scale), 'title': 'updated', 'score': 0}),
+                repeat=scale),
+        measure('mysql.update_many(100)',
+                lambda: table.update_many({'id': random.randrange(scale), 'title': 'batched', 'score': 0} for _ in range(100)),
+                repeat=scale // 10, items_per_op=100),
+        measure('mysql.update_by_id', lambda: table.update_by_id(random.randrange(scale), {'title': 'targeted'}),
+                repeat=scale),
+        measure('mysql.count', lambda: table.count(), repeat=scale // 4),
+    ]
+    results.append(measure('mysql.get_all', lambda: sum(1 for _ in table.get_all(page_size=500)),
+                           repeat=5, items_per_op=table.count()))
+
+    return results
+
+
+def bench_sync(scale: int) -> list[BenchResult]:
+    mysql_util = _import('mysql_util')
+    es_util = _import('es_util')
+    sync_util = _import('sync_util')
+    logging_util = _import('logging_util')
+
+    conn = stubs.SQLiteConnection()
+    conn.cursor().execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, title TEXT, score REAL, created_at TEXT)')
+    table = mysql_util.MySQLTable(conn=conn, table_name='bench')
+    for i in range(1, scale * 10 + 1):
+        doc = _make_doc(i)
+        table.insert_one({'id': i, 'title': doc['title'], 'score': doc['score'], 'created_at': doc['created_at']})
+
+    logging_util.set_stream(use_stdout=False)
+
+    try:
+        with stubs.EsStubServer() as server, tempfile.TemporaryDirectory() as tmp_dir:
+            index = es_util.EsClient(server.host).get_index('bench')
+
+            watermark_path = os.path.join(tmp_dir, 'watermark.json')
+
+            def _full_sync():
+                if os.path.exists(watermark_path):
+                    os.remove(watermark_path)
+                # SQLite替身内部有锁，读取线程可以直接共享同一个连接
+                sync_util.MySQL2EsSync(table=table, index=index, watermark_path=watermark_path, batch_size=500,
+                                       reader_table=table).run()
+
+            return [measure('sync.mysql_to_es', _full_sync, repeat=3, items_per_op=scale * 10)]
+    finally:
+        logging_util.set_stream(use_stdout=True)
+
+
+def bench_export(scale: int) -> list[BenchResult]:
+    db_util = _import('db_util')
+    collection = stubs.FakeMongoClient()['bench']['docs']
+    collection.docs.clear()
+    collection.insert_many({'_id': stubs.make_object_id(), **_make_doc(i)} for i in range(scale * 10))
+
+    original = db_util._pymongo
+    db_util._pymongo = types.SimpleNamespace(MongoClient=stubs.FakeMongoClient)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'export.json')
+            def _export(**kwargs):
+                db_util.export_table(dbms='MongoDB', host='mongodb://stub', database='bench', table='docs',
+                                     output_path=output_path, use_tqdm=False, **kwargs)
+
+            return [
+                measure('db.export_table(mongodb)', _export, repeat=3, items_per_op=len(collection.docs)),
+                measure('db.export_table(mongodb, projection)', lambda: _export(projection=['title', 'score']),
+                        repeat=3, items_per_op=len(collection.docs)),
+                measure('db.export_table(mongodb, 4 partitions)', lambda: _export(num_partitions=4),
+                        repeat=3, items_per_op=len(collection.docs)),
+            ]
+    finally:
+        db_util._pymongo = original
+
+
+def bench_json(scale: int) -> list[BenchResult]:
+    json_util = _import('json_util')
+    docs = [_make_doc(i) for i in range(scale)]
+    encoded = [json_util.json_dump(doc) for doc in docs]
+
+    return [
+        measure('json.json_dump', lambda: [json_util.json_dump(doc) for doc in docs], repeat=10, items_per_op=len(docs)),
+        measure('json.json_load', lambda: [json_util.json_load(s) for s in encoded], repeat=10, items_per_op=len(docs)),
+    ]
+
+
+def bench_datetime(scale: int) -> list[BenchResult]:
+    datetime_util = _import('datetime_util')
+    samples = {
+        'first_format': '2022-02-06 18:46:27',
+        'date_only': '2022-02-06',
+        'last_format': '2022年02月06日',
+    }
+    return [
+        measure(f'datetime.str2datetime({label})',
+                lambda s=s: [datetime_util.str2datetime(s) for _ in range(scale)],
+                repeat=10, items_per_op=scale)
+        for label, s in samples.items()
+    ]
+
+
+def bench_torch(scale: int) -> list[BenchResult]:
+    torch_util = _import('torch_util')
+    num_samples = scale * 1000
+    results = [
+        measure('torch.idx_batch_generator', lambda: sum(1 for _ in torch_util.idx_batch_generator(num_samples, 256)),
+                repeat=5, items_per_op=num_samples),
+        measure('torch.stream_idx_batch_generator',
+                lambda: sum(1 for _ in torch_util.stream_idx_batch_generator(num_samples, 256, num_shards=1, shard_id=0)),
+                repeat=5, items_per_op=num_samples),
+    ]
+
+    features = torch_util.np.random.rand(num_samples // 10, 64).astype('float32')
+    labels = torch_util.np.random.randint(0, 10, num_samples // 10)
+    loader = torch_util.BatchLoader(features, labels, batch_size=256)
+    results.append(measure('torch.BatchLoader', lambda: sum(1 for _ in loader), repeat=5, items_per_op=len(labels)))
+
+    return results
+
+
+BENCHMARKS: dict[str, typing.Callable[[int], list[BenchResult]]] = {
+    'es': bench_es,
+    'mysql': bench_mysql,
+    'sync': bench_sync,
+    'export': bench_export,
+    'json': bench_json,
+    'datetime': bench_datetime,
+    'torch': bench_torch,
+}
+
+
+# ==========运行与比较==========
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=_REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _compare(results: list[dict], baseline_path: str, threshold: float, selected_groups: set[str]) -> bool:
+    """
+    与基准结果比较items_per_sec，打印比值，返回是否存在超过阈值的退化。
+
+    基准中属于本次选中的用例组、但本次结果中缺失的用例同样视为退化。
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as fp:
+        baseline = {r['name']: r for r in json.load(fp)['results']}
+
+    current = {r['name']: r for r in results}
+    regressed = False
+    print(f"\n{'benchmark':<45}{'baseline':>14}{'current':>14}{'ratio':>9}")
+
+    for name, old_result in baseline.items():
+        old = old_result['items_per_sec']
+
+        if name not in current:
+            if old_result.get('group') in selected_groups:
+                regressed = True
+                print(f"{name:<45}{old:>14.1f}{'missing':>14}{'':>9}  [REGRESSION]")
+            continue
+
+        new = current[name]['items_per_sec']
+        ratio = new / old if old else float('inf')
+        flag = ''
+        if ratio < 1 - threshold:
+            regressed = True
+            flag = '  [REGRESSION]'
+        print(f"{name:<45}{old:>14.1f}{new:>14.1f}{ratio:>9.2f}{flag}")
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=500, help='每个用例的基本操作次数')
+    parser.add_argument('--only', type=str, default='')
+    parser.add_argument('--output', type=str, default='')
+    parser.add_argument('--compare', type=str, default='', help='基准结果文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='吞吐量下降超过该比例视为退化')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results: list[dict] = []
+    skipped: dict[str, str] = dict()
+    failed: dict[str, str] = dict()
+    selected_groups: set[str] = set()
+
+    for group, bench_fn in BENCHMARKS.items():
+        if args.only and args.only not in group:
+            continue
+        try:
+            group_results = bench_fn(args.scale)
+        except ImportError as e:
+            # 缺少依赖属于环境问题，不视为失败
+            skipped[group] = f'missing dependency: {e.name}'
+            print(f"{group}: skipped ({skipped[group]})")
+            continue
+        except Exception:
+            failed[group] = traceback.format_exc().strip()
+            print(f"{group}: failed  [FAIL]\n{failed[group]}")
+            selected_groups.add(group)
+            continue
+
+        selected_groups.add(group)
+
+        for r in group_results:
+            print(f"{r.name:<45}{r.items_per_sec:>14.1f} items/s   p50 {r.p50_ms:8.3f} ms   p95 {r.p95_ms:8.3f} ms")
+            results.append({'group': group, **r._asdict()})
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'results': results,
+        'skipped': skipped,
+        'failed': failed,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+
+    regressed = bool(args.compare) and _compare(results, args.compare, args.threshold, selected_groups)
+
+    if failed or regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
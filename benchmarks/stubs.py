@@ -0,0 +1,558 @@
+"""
+基准测试使用的本地替身：
+
+1. EsStubServer：进程内的HTTP服务，模拟EsIndex用到的Elasticsearch接口；
+2. SQLiteConnection：基于sqlite3的内存数据库，接口与MySQLTable使用的pymysql连接一致；
+3. FakeMongoClient：类似mongomock的内存MongoDB客户端，供db_util.export_table使用。
+"""
+import itertools
+import json
+import random
+import re
+import sqlite3
+import threading
+import typing
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+# ==========Elasticsearch==========
+
+def _get_field(doc: dict, field: str):
+    value = doc
+    for key in field.split('.'):
+        if key == 'keyword':
+            continue
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _match_query(query: typing.Optional[dict], doc: dict) -> bool:
+    """
+    只实现了基准测试用到的查询：match_all、term、match、range、bool。
+    """
+    if not query or 'match_all' in query:
+        return True
+
+    (method, body), = query.items()
+
+    if method in ('term', 'match', 'match_phrase'):
+        (field, value), = body.items()
+        if isinstance(value, dict):
+            value = value.get('value', value.get('query'))
+        return _get_field(doc, field) == value
+    elif method == 'terms':
+        (field, values), = body.items()
+        return _get_field(doc, field) in values
+    elif method == 'range':
+        (field, cond), = body.items()
+        value = _get_field(doc, field)
+        if value is None:
+            return False
+        return all([
+            'gt' not in cond or value > cond['gt'],
+            'gte' not in cond or value >= cond['gte'],
+            'lt' not in cond or value < cond['lt'],
+            'lte' not in cond or value <= cond['lte'],
+        ])
+    elif method == 'bool':
+        must = body.get('must', []) + body.get('filter', [])
+        must_not = body.get('must_not', [])
+        should = body.get('should', [])
+        return all(_match_query(q, doc) for q in must) \
+            and not any(_match_query(q, doc) for q in must_not) \
+            and (not should or any(_match_query(q, doc) for q in should))
+    else:
+        raise NotImplementedError(method)
+
+
+class _EsStubHandler(BaseHTTPRequestHandler):
+    server: 'EsStubServer'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: typing.Any):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method: str):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        raw_body = self._read_body()
+
+        if parts and parts[-1] == '_bulk':
+            body = raw_body
+        else:
+            body = json.loads(raw_body) if raw_body else None
+
+        with self.server.lock:
+            self.server.request_counts[f'{method} {"/".join(p if p.startswith("_") else "*" for p in parts)}'] += 1
+            status, resp = self.server.dispatch(method, parts, params, body)
+
+        self._reply(status, resp)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def do_HEAD(self):
+        self._handle('HEAD')
+
+
+class _RequestCounter(dict):
+    def __missing__(self, key):
+        return 0
+
+
+class EsStubServer(ThreadingHTTPServer):
+    """
+    模拟Elasticsearch的HTTP服务，所有数据保存在内存中。
+
+    用法：
+        with EsStubServer() as server:
+            client = EsClient(server.host)
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int = 0):
+        super().__init__(('127.0.0.1', port), _EsStubHandler)
+        self.lock = threading.RLock()
+        self.indices: dict[str, dict[str, dict]] = dict()
+        self.mappings: dict[str, dict] = dict()
+        self.settings: dict[str, dict] = dict()
+        self.scrolls: dict[str, tuple[str, list, int]] = dict()
+        self.tasks: dict[str, dict] = dict()
+        self.request_counts = _RequestCounter()
+        self._thread: typing.Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self) -> 'EsStubServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    # ----------请求分发----------
+
+    def dispatch(self, method: str, parts: list[str], params: dict, body) -> tuple[int, typing.Any]:
+        if parts == ['_search', 'scroll']:
+            return self._scroll(body)
+        if parts == ['_bulk']:
+            return self._bulk(None, body, params)
+        if parts == ['_reindex']:
+            return self._reindex(body, params)
+        if len(parts) == 2 and parts[0] == '_tasks':
+            return self._get_task(parts[1])
+        if len(parts) == 1:
+            return self._index_op(method, parts[0], body)
+
+        index, op = parts[0], parts[-1]
+        is_doc_write = method in ('PUT', 'POST') and not op.startswith('_')
+
+        if op == '_bulk':
+            return self._bulk(index, body, params)
+        if index not in self.indices and not is_doc_write:
+            return 404, {'error': {'type': 'index_not_found_exception'}, 'status': 404}
+        if op == '_mapping':
+            return 200, {index: {'mappings': self.mappings.get(index, {})}}
+        if op == '_settings':
+            return self._settings(method, index, body)
+        if op == '_refresh':
+            return 200, {'_shards': {'successful': 1}}
+        if op == '_count':
+            query = (body or {}).get('query')
+            return 200, {'count': sum(_match_query(query, doc) for doc in self.indices[index].values())}
+        if op == '_search':
+            return self._search(index, params, body or {})
+        if op == '_delete_by_query':
+            query = (body or {}).get('query')
+            docs = self.indices[index]
+            ids = [_id for _id, doc in docs.items() if _match_query(query, doc)]
+            for _id in ids:
+                del docs[_id]
+            return 200, {'deleted': len(ids)}
+        if len(parts) == 2:
+            # POST /{index}/{type}：自动生成_id
+            return self._put_doc(index, uuid.uuid4().hex, body)
+        if len(parts) >= 3:
+            _id = parts[2]
+            if is_doc_write:
+                return self._put_doc(index, _id, body)
+            if method == 'GET':
+                doc = self.indices[index].get(_id)
+                if doc is None:
+                    return 404, {'_index': index, '_id': _id, 'found': False}
+                return 200, {'_index': index, '_id': _id, 'found': True, '_source': doc}
+            if method == 'DELETE':
+                if self.indices[index].pop(_id, None) is None:
+                    return 404, {'_index': index, '_id': _id, 'result': 'not_found'}
+                return 200, {'_index': index, '_id': _id, 'result': 'deleted'}
+
+        return 400, {'error': f'unsupported request: {method} /{"/".join(parts)}'}
+
+    def _index_op(self, method: str, index: str, body) -> tuple[int, typing.Any]:
+        if method == 'PUT':
+            if index in self.indices:
+                return 400, {'error': {'type': 'resource_already_exists_exception'}, 'status': 400}
+            self.indices[index] = dict()
+            self.mappings[index] = (body or {}).get('mappings', {})
+            self.settings[index] = (body or {}).get('settings', {})
+            return 200, {'acknowledged': True, 'index': index}
+        if method == 'DELETE':
+            if self.indices.pop(index, None) is None:
+                return 404, {'error': {'type': 'index_not_found_exception'}, 'status': 404}
+            self.mappings.pop(index, None)
+            self.settings.pop(index, None)
+            return 200, {'acknowledged': True}
+        if method in ('GET', 'HEAD'):
+            if index not in self.indices:
+                return 404, {'error': {'type': 'index_not_found_exception'}, 'status': 404}
+            return 200, {index: {'mappings': self.mappings[index], 'settings': self.settings[index]}}
+        return 400, {'error': 'unsupported'}
+
+    def _settings(self, method: str, index: str, body) -> tuple[int, typing.Any]:
+        if method == 'PUT':
+            settings = self.settings.setdefault(index, dict())
+            for key, value in (body or {}).get('index', body or {}).items():
+                if value is None:
+                    settings.pop(key, None)
+                else:
+                    settings[key] = str(value)
+            return 200, {'acknowledged': True}
+        return 200, {index: {'settings': {'index': self.settings.get(index, {})}}}
+
+    def _reindex(self, body: dict, params: dict) -> tuple[int, typing.Any]:
+        source, dest = body['source']['index'], body['dest']['index']
+        if source not in self.indices:
+            return 404, {'error': {'type': 'index_not_found_exception'}, 'status': 404}
+
+        dest_docs = self.indices.setdefault(dest, dict())
+        created = sum(1 for _id in self.indices[source] if _id not in dest_docs)
+        updated = len(self.indices[source]) - created
+        dest_docs.update((_id, dict(doc)) for _id, doc in self.indices[source].items())
+
+        result = {'took': 0, 'total': created + updated, 'created': created, 'updated': updated, 'failures': []}
+
+        if params.get('wait_for_completion') == 'false':
+            # 复制是同步完成的，任务在返回时已经结束
+            task_id = f'stub:{len(self.tasks) + 1}'
+            self.tasks[task_id] = {'completed': True, 'task': {'action': 'indices:data/write/reindex'}, 'response': result}
+            return 200, {'task': task_id}
+
+        return 200, result
+
+    def _get_task(self, task_id: str) -> tuple[int, typing.Any]:
+        if task_id not in self.tasks:
+            return 404, {'error': {'type': 'resource_not_found_exception'}, 'status': 404}
+
+        return 200, self.tasks[task_id]
+
+    def _put_doc(self, index: str, _id: str, doc: dict) -> tuple[int, typing.Any]:
+        docs = self.indices.setdefault(index, dict())
+        result = 'updated' if _id in docs else 'created'
+        docs[_id] = doc
+        return (200 if result == 'updated' else 201), {'_index': index, '_id': _id, 'result': result}
+
+    def _hits(self, index: str, ids: list[str]) -> list[dict]:
+        docs = self.indices.get(index, {})
+        return [{'_index': index, '_id': _id, '_score': 1.0, '_source': docs[_id]} for _id in ids if _id in docs]
+
+    def _search(self, index: str, params: dict, body: dict) -> tuple[int, typing.Any]:
+        query = body.get('query')
+        size = body.get('size', 10)
+        ids = [_id for _id, doc in self.indices[index].items() if _match_query(query, doc)]
+
+        if 'slice' in body:
+            slice_id, slice_max = body['slice']['id'], body['slice']['max']
+            ids = [_id for _id in ids if hash(_id) % slice_max == slice_id]
+
+        if 'scroll' in params:
+            scroll_id = uuid.uuid4().hex
+            page, rest = ids[:size], ids[size:]
+            self.scrolls[scroll_id] = (index, rest, size)
+            return 200, {'_scroll_id': scroll_id, 'hits': {'total': {'value': len(ids)}, 'hits': self._hits(index, page)}}
+
+        return 200, {'hits': {'total': {'value': len(ids)}, 'hits': self._hits(index, ids[:size])}}
+
+    def _scroll(self, body: dict) -> tuple[int, typing.Any]:
+        scroll_id = body['scroll_id']
+        if scroll_id not in self.scrolls:
+            return 404, {'error': {'type': 'search_context_missing_exception'}}
+        index, ids, size = self.scrolls[scroll_id]
+        page, rest = ids[:size], ids[size:]
+        self.scrolls[scroll_id] = (index, rest, size)
+        return 200, {'_scroll_id': scroll_id, 'hits': {'hits': self._hits(index, page)}}
+
+    def _bulk(self, default_index: typing.Optional[str], body: bytes, params: dict) -> tuple[int, typing.Any]:
+        lines = [line for line in body.decode('utf-8').splitlines() if line.strip()]
+        items = []
+        errors = False
+        i = 0
+
+        while i < len(lines):
+            (action, meta), = json.loads(lines[i]).items()
+            index = meta.get('_index', default_index)
+            _id = meta.get('_id') or uuid.uuid4().hex
+            _id = str(_id)
+            docs = self.indices.setdefault(index, dict())
+
+            if action == 'delete':
+                found = docs.pop(_id, None) is not None
+                items.append({action: {'_index': index, '_id': _id, 'status': 200 if found else 404}})
+                i += 1
+                continue
+
+            source = json.loads(lines[i + 1])
+            i += 2
+
+            if action == 'create' and _id in docs:
+                errors = True
+                items.append({action: {'_index': index, '_id': _id, 'status': 409,
+                                       'error': {'type': 'version_conflict_engine_exception'}}})
+            elif action == 'update':
+                if _id not in docs and 'doc_as_upsert' not in source:
+                    errors = True
+                    items.append({action: {'_index': index, '_id': _id, 'status': 404,
+                                           'error': {'type': 'document_missing_exception'}}})
+                else:
+                    docs.setdefault(_id, dict()).update(source.get('doc', {}))
+                    items.append({action: {'_index': index, '_id': _id, 'status': 200}})
+            else:
+                status = 200 if _id in docs else 201
+                docs[_id] = source
+                items.append({action: {'_index': index, '_id': _id, 'status': status}})
+
+        return 200, {'took': 0, 'errors': errors, 'items': items}
+
+
+# ==========MySQL==========
+
+class SQLiteCursor:
+    """
+    将pymysql风格的SQL（%s占位符、TRUNCATE等）转换后交给sqlite3执行，查询结果以dict形式返回。
+    """
+    def __init__(self, conn: sqlite3.Connection, lock: threading.RLock):
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._lock = lock
+        self._result: list[dict] = []
+
+    def _column_default(self, table: str, column: str) -> str:
+        for _, name, _, _, default, _ in self._conn.execute(f"PRAGMA table_info('{table}')"):
+            if name == column:
+                return default if default is not None else 'NULL'
+        raise sqlite3.OperationalError(f'no such column: {column}')
+
+    def _translate(self, sql: str) -> str:
+        sql = re.sub(r'^\s*TRUNCATE\s+TABLE\s+', 'DELETE FROM ', sql, flags=re.IGNORECASE)
+        sql = re.sub(r'^\s*SHOW\s+COLUMNS\s+FROM\s+(\w+)',
+                     r"SELECT name AS Field, '' AS Extra FROM pragma_table_info('\1')",
+                     sql, flags=re.IGNORECASE)
+
+        # INSERT ... ON DUPLICATE KEY UPDATE a = VALUES(a), b = DEFAULT(b)
+        # -> INSERT ... ON CONFLICT DO UPDATE SET a = excluded.a, b = <b的默认值>
+        head, sep, tail = sql.partition(' ON DUPLICATE KEY UPDATE ')
+        if sep:
+            table = re.match(r'\s*INSERT\s+INTO\s+(\w+)', head, flags=re.IGNORECASE).group(1)
+            tail = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', tail)
+            tail = re.sub(r'DEFAULT\((\w+)\)', lambda m: self._column_default(table, m.group(1)), tail)
+            sql = head + ' ON CONFLICT DO UPDATE SET ' + tail
+
+        return sql.replace('%s', '?')
+
+    def _rows(self, rows: list) -> list[dict]:
+        names = [d[0] for d in self._cursor.description or ()]
+        return [dict(zip(names, row)) for row in rows]
+
+    def execute(self, sql: str, args: typing.Optional[typing.Sequence] = None) -> int:
+        with self._lock:
+            self._cursor.execute(self._translate(sql), list(args or ()))
+            self._result = self._rows(self._cursor.fetchall()) if self._cursor.description else []
+            return self._cursor.rowcount
+
+    def executemany(self, sql: str, args: typing.Iterable[typing.Sequence]) -> int:
+        with self._lock:
+            self._cursor.executemany(self._translate(sql), [list(a) for a in args])
+            self._result = []
+            return self._cursor.rowcount
+
+    def fetchone(self) -> typing.Optional[dict]:
+        return self._result.pop(0) if self._result else None
+
+    def fetchall(self) -> list[dict]:
+        result, self._result = self._result, []
+        return result
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self) -> 'SQLiteCursor':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SQLiteConnection:
+    """
+    可以直接传给MySQLTable的内存数据库连接。
+    """
+    def __init__(self, path: str = ':memory:'):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+
+    def cursor(self) -> SQLiteCursor:
+        return SQLiteCursor(self._conn, self._lock)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self._conn.close()
+
+
+# ==========MongoDB==========
+
+def _match_mongo_value(value, cond) -> bool:
+    if not isinstance(cond, dict) or not any(key.startswith('$') for key in cond):
+        return value == cond
+
+    ops = {
+        '$eq': lambda v, c: v == c,
+        '$ne': lambda v, c: v != c,
+        '$gt': lambda v, c: v is not None and v > c,
+        '$gte': lambda v, c: v is not None and v >= c,
+        '$lt': lambda v, c: v is not None and v < c,
+        '$lte': lambda v, c: v is not None and v <= c,
+        '$in': lambda v, c: v in c,
+    }
+    return all(ops[op](value, c) for op, c in cond.items())
+
+
+def _match_mongo_filter(filter: typing.Optional[dict], doc: dict) -> bool:
+    """
+    只实现了基准测试用到的过滤条件：等值、$and、$or以及比较运算符。
+    """
+    for key, cond in (filter or {}).items():
+        if key == '$and':
+            if not all(_match_mongo_filter(f, doc) for f in cond):
+                return False
+        elif key == '$or':
+            if not any(_match_mongo_filter(f, doc) for f in cond):
+                return False
+        elif not _match_mongo_value(doc.get(key), cond):
+            return False
+    return True
+
+
+class FakeMongoCollection:
+    def __init__(self):
+        self.docs: list[dict] = []
+
+    def insert_many(self, docs: typing.Iterable[dict]):
+        self.docs.extend(docs)
+
+    def find(self, filter: typing.Optional[dict] = None, projection=None, batch_size: int = 0, **kwargs) -> typing.Iterator[dict]:
+        for doc in self.docs:
+            if not _match_mongo_filter(filter, doc):
+                continue
+            if projection:
+                fields = projection if isinstance(projection, dict) else dict.fromkeys(projection, 1)
+                doc = {k: v for k, v in doc.items() if fields.get(k, k == '_id')}
+            yield dict(doc)
+
+    def count_documents(self, filter: dict) -> int:
+        return sum(1 for _ in self.find(filter))
+
+    def aggregate(self, pipeline: list[dict]) -> typing.Iterator[dict]:
+        """
+        只支持$match、$sample、$project三种阶段。
+        """
+        docs = list(self.docs)
+
+        for stage in pipeline:
+            (op, arg), = stage.items()
+            if op == '$match':
+                docs = [doc for doc in docs if _match_mongo_filter(arg, doc)]
+            elif op == '$sample':
+                docs = random.sample(docs, min(arg['size'], len(docs)))
+            elif op == '$project':
+                docs = [{k: v for k, v in doc.items() if arg.get(k, k == '_id')} for doc in docs]
+            else:
+                raise NotImplementedError(op)
+
+        return iter(docs)
+
+
+class FakeMongoClient:
+    """
+    类似mongomock的内存客户端。所有实例共享同一份数据，以便export_table内部创建的客户端可以读到预置的数据。
+    """
+    store: dict[str, dict[str, FakeMongoCollection]] = dict()
+
+    def __init__(self, host: str = '', **kwargs):
+        self.host = host
+
+    def __getitem__(self, database: str) -> dict[str, FakeMongoCollection]:
+        return _FakeMongoDatabase(self.store.setdefault(database, dict()))
+
+    def close(self):
+        pass
+
+
+class _FakeMongoDatabase:
+    def __init__(self, collections: dict[str, FakeMongoCollection]):
+        self._collections = collections
+
+    def __getitem__(self, name: str) -> FakeMongoCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeMongoCollection()
+        return self._collections[name]
+
+
+_id_counter = itertools.count()
+
+
+def make_object_id():
+    """
+    生成ObjectId；没有安装bson时退化为自增整数。
+    """
+    try:
+        from bson import ObjectId
+    except ImportError:
+        return next(_id_counter)
+    else:
+        return ObjectId()
@@ -1,34 +1,142 @@
 from . import json_util
-from pymongo import MongoClient
-from tqdm import tqdm 
+from .lazy_util import LazyModule as _LazyModule
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import typing
+
+_pymongo = _LazyModule('pymongo')
+_tqdm = _LazyModule('tqdm')
+
+
+def _get_partition_path(output_path: str, partition_id: int) -> str:
+    """
+    分区导出时每个分区的输出路径，形如xxx.00000.json。
+    """
+    return f'{output_path[:-len(".json")]}.{partition_id:05d}.json'
+
+
+def _split_id_ranges(mongo_collection, query: dict, num_partitions: int, sample_factor: int = 20) -> list[dict]:
+    """
+    对符合条件的文档的_id进行抽样，按抽样的分位数将集合划分为num_partitions个_id区间，返回每个区间对应的查询条件。
+
+    要求_id的类型一致（如都是ObjectId）。
+    """
+    pipeline = [
+        { '$match': query },
+        { '$sample': { 'size': num_partitions * sample_factor } },
+        { '$project': { '_id': 1 } },
+    ]
+    sample_ids = sorted(entry['_id'] for entry in mongo_collection.aggregate(pipeline))
+
+    boundaries = []
+    for i in range(1, num_partitions):
+        if not sample_ids:
+            break
+        boundary = sample_ids[len(sample_ids) * i // num_partitions]
+        if not boundaries or boundary != boundaries[-1]:
+            boundaries.append(boundary)
+
+    ranges = []
+    for i in range(len(boundaries) + 1):
+        id_range = {}
+        if i > 0:
+            id_range['$gte'] = boundaries[i - 1]
+        if i < len(boundaries):
+            id_range['$lt'] = boundaries[i]
+
+        if id_range:
+            ranges.append({ '$and': [query, { '_id': id_range }] })
+        else:
+            ranges.append(query)
+
+    return ranges
+
+
+def _export_mongo_cursor(cursor: typing.Iterable[dict],
+                         fp,
+                         on_progress: typing.Callable[[int], None],
+                         progress_step: int = 1000) -> int:
+    """
+    将游标中的文档逐行写入文件，每写入progress_step个文档调用一次on_progress。
+    """
+    num_exported = 0
+
+    for entry in cursor:
+        json_str = json_util.json_dump(entry).strip()
+        fp.write(json_str + '\n')
+        num_exported += 1
+
+        if num_exported % progress_step == 0:
+            on_progress(progress_step)
+
+    on_progress(num_exported % progress_step)
+
+    return num_exported
 
 
 def export_table(*,
-                 dbms: str, 
+                 dbms: str,
                  host: str,
                  database: str,
-                 table: str, 
+                 table: str,
                  output_path: str,
-                 use_tqdm: bool = True):
+                 use_tqdm: bool = True,
+                 query: typing.Optional[dict] = None,
+                 projection: typing.Union[None, list[str], dict] = None,
+                 batch_size: int = 0,
+                 num_partitions: int = 1):
     """
     导出数据库中的表。
-    
+
     以JSON文件形式导出表的DDL（如果有的话）和所有记录，每一条记录占一行。
-    
+
     支持的数据库(DBMS)如下：
     1. MySQL
     2. MongoDB(table_path: ['MongoDB', ip_addr, database, collection])
     3. Elasticsearch
+
+    对于MongoDB，可以指定查询条件query、字段投影projection以及游标的batch_size（0表示使用服务端默认值）。
+    num_partitions大于1时，按抽样得到的_id区间将集合划分为多个分区并行导出，
+    每个分区写入单独的文件，形如xxx.00000.json、xxx.00001.json。
     """
     assert output_path.endswith('.json')
-    
-    with open(output_path, 'w', encoding='utf-8') as fp:
-        if dbms.lower() == 'MongoDB'.lower():
-            mongo_client = MongoClient(host)
-            mongo_collection = mongo_client[database][table]
-            
-            for entry in tqdm(mongo_collection.find(), disable=not use_tqdm):
-                json_str = json_util.json_dump(entry).strip()
-                print(json_str, file=fp, flush=True)
+    assert num_partitions >= 1
+
+    if dbms.lower() == 'MongoDB'.lower():
+        mongo_client = _pymongo.MongoClient(host)
+        mongo_collection = mongo_client[database][table]
+        query = query or {}
+
+        def _find(partition_query: dict):
+            return mongo_collection.find(partition_query, projection, batch_size=batch_size)
+
+        if num_partitions == 1:
+            with open(output_path, 'w', encoding='utf-8') as fp:
+                with _tqdm.tqdm(disable=not use_tqdm) as pbar:
+                    _export_mongo_cursor(_find(query), fp, pbar.update)
         else:
-            raise AssertionError
+            partition_queries = _split_id_ranges(mongo_collection, query, num_partitions)
+
+            pbar_lock = threading.Lock()
+
+            with _tqdm.tqdm(disable=not use_tqdm) as pbar:
+                def _on_progress(n: int):
+                    with pbar_lock:
+                        pbar.update(n)
+
+                def _export_partition(partition_id: int) -> int:
+                    partition_path = _get_partition_path(output_path, partition_id)
+                    with open(partition_path, 'w', encoding='utf-8') as fp:
+                        return _export_mongo_cursor(_find(partition_queries[partition_id]), fp, _on_progress)
+
+                with ThreadPoolExecutor(max_workers=len(partition_queries)) as executor:
+                    list(executor.map(_export_partition, range(len(partition_queries))))
+
+            # 删除上一次导出时残留的多余分区文件
+            partition_id = len(partition_queries)
+            while os.path.exists(_get_partition_path(output_path, partition_id)):
+                os.remove(_get_partition_path(output_path, partition_id))
+                partition_id += 1
+    else:
+        raise AssertionError
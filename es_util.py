@@ -1,6 +1,11 @@
 import requests
 from pprint import pprint as _pprint 
 import typing 
+import json
+import threading
+import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # 当请求成功时HTTP状态码的范围
 SUCCESS_CODE = range(200, 300)
@@ -32,6 +37,15 @@ class IndexNotExistError(RuntimeError):
     pass
 
 
+class BulkError(RuntimeError):
+    """
+    批量操作中存在失败的条目时抛出的异常，failed_items为失败条目的响应。
+    """
+    def __init__(self, failed_items: list[dict]):
+        super().__init__(f'{len(failed_items)} items failed in bulk request')
+        self.failed_items = failed_items
+
+
 class EsClient:
     def __init__(self, host: str):
         """
@@ -145,6 +159,65 @@ class EsIndex:
 
         return resp.json()['_id']
 
+    def bulk_save(self, entries: typing.Iterable[dict], refresh: typing.Union[bool, str] = False) -> list[str]:
+        """
+        批量新增文档，通过一次_bulk请求完成。每个文档都必须提供_id，将覆盖已有_id的文档。
+
+        refresh可以为True、False或'wait_for'，'wait_for'表示等待下一次刷新后再返回，而不强制刷新。
+        无法JSON序列化的值（如datetime）将以str()的形式写入。
+        """
+        lines = []
+        ids = []
+
+        for entry in entries:
+            entry = dict(entry)
+            _id = _extract_entry_id(entry)
+            assert _id
+
+            meta = {'_index': self.index_name, '_id': _id}
+            if self.type_name != '_doc':
+                meta['_type'] = self.type_name
+
+            lines.append(json.dumps({'index': meta}))
+            lines.append(json.dumps(entry, ensure_ascii=False, default=str))
+            ids.append(_id)
+
+        if not ids:
+            return ids
+
+        if refresh is True:
+            params = {'refresh': 'true'}
+        elif refresh:
+            params = {'refresh': refresh}
+        else:
+            params = None
+
+        resp = requests.post(url=f'{self.host}/{self.index_name}/_bulk',
+                             params=params,
+                             data=('\n'.join(lines) + '\n').encode('utf-8'),
+                             headers={'Content-Type': 'application/x-ndjson'})
+        if resp.status_code not in SUCCESS_CODE:
+            raise UnknownError(resp)
+
+        resp_json = resp.json()
+        if resp_json.get('errors'):
+            raise BulkError([item for item in resp_json['items']
+                             if next(iter(item.values())).get('status') not in SUCCESS_CODE])
+
+        return ids
+
+    def write_session(self,
+                      batch_size: int = 500,
+                      refresh_interval: float = 1.0,
+                      use_wait_for: bool = False) -> 'EsWriteSession':
+        """
+        创建批量写入会话，见EsWriteSession。
+        """
+        return EsWriteSession(index=self,
+                              batch_size=batch_size,
+                              refresh_interval=refresh_interval,
+                              use_wait_for=use_wait_for)
+
     def delete_by_id(self, _id: typing.Union[str, int]) -> bool:
         """
         根据_id删除文档。删除成功返回真，删除失败（即_id不存在）返回假。
@@ -230,9 +303,15 @@ class EsIndex:
         
         return resp_json['count']
 
-    def scroll_search(self, query: dict, page_size: int = 1000) -> typing.Iterable[dict]:
+    def scroll_search(self,
+                      query: dict,
+                      page_size: int = 1000,
+                      slice_id: typing.Optional[int] = None,
+                      num_slices: typing.Optional[int] = None) -> typing.Iterable[dict]:
         """
         滚动搜索，用于解决ES不能深度分页的问题。
+
+        可以通过slice_id和num_slices进行分片滚动（sliced scroll），多个分片可以并行查询。
         """
         scroll_id = None
         
@@ -243,6 +322,8 @@ class EsIndex:
                     'query': query,
                     'sort': ['_doc'],
                 }
+                if num_slices and num_slices > 1:
+                    request_body['slice'] = { 'id': slice_id, 'max': num_slices }
                 request_url = f'{self.host}/{self.index_name}/{self.type_name}/_search?scroll=17m'
             else:
                 request_body = {
@@ -281,6 +362,182 @@ class EsIndex:
         for entry in iter_:
             yield entry
 
+    def exists(self) -> bool:
+        """
+        判断当前索引是否存在。
+        """
+        resp = requests.head(f'{self.host}/{self.index_name}')
+
+        if resp.status_code in SUCCESS_CODE:
+            return True
+        elif resp.status_code == 404:
+            return False
+        else:
+            raise UnknownError(resp)
+
+    def get_settings(self) -> dict:
+        """
+        查询当前索引的设置，如refresh_interval、number_of_replicas等。
+        """
+        resp = requests.get(f'{self.host}/{self.index_name}/_settings')
+
+        if resp.status_code == 404:
+            raise IndexNotExistError
+
+        if resp.status_code not in SUCCESS_CODE:
+            raise UnknownError(resp)
+
+        # index_name可能是别名，响应中的键是实际的索引名
+        resp_json = resp.json()
+        assert len(resp_json) == 1
+
+        return next(iter(resp_json.values()))['settings']['index']
+
+    def update_settings(self, settings: dict):
+        """
+        修改当前索引的动态设置。值为None表示恢复为默认值。
+        """
+        resp = requests.put(f'{self.host}/{self.index_name}/_settings', json={ 'index': settings })
+
+        if resp.status_code == 404:
+            raise IndexNotExistError
+
+        if resp.status_code not in SUCCESS_CODE:
+            raise UnknownError(resp)
+
+    def copy_to(self,
+                target_index: typing.Union['EsIndex', str],
+                transform: typing.Optional[typing.Callable[[dict], typing.Optional[dict]]] = None,
+                properties: typing.Optional[dict] = None,
+                num_slices: int = 4,
+                page_size: int = 1000) -> int:
+        """
+        将当前索引的所有文档复制到目标索引，返回复制的文档数量。
+
+        如果目标索引不存在，将先创建之：指定properties时通过create_mapping创建（支持cn_text、text_keyword等特殊mapping），
+        否则沿用当前索引的mapping以及analysis设置（自定义分析器）。目标索引已存在时不能指定properties。复制期间关闭目标索引的刷新和副本，完成后恢复原设置并刷新。
+
+        不指定transform时，使用服务端的_reindex（slices=auto）；
+        指定transform时，使用num_slices个分片并行滚动查询，经过transform转换后批量写入。
+        transform返回None时跳过该文档；返回的文档如果没有_id，沿用原文档的_id。
+        """
+        if isinstance(target_index, str):
+            target_index = EsIndex(client=EsClient(self.host), index_name=target_index, type_name=self.type_name)
+
+        if target_index.exists():
+            # 不会修改已有索引的mapping
+            assert not properties
+        elif properties:
+            target_index.create_mapping(properties)
+        else:
+            # index_name可能是别名，响应中的键是实际的索引名
+            resp_json = self.get_mapping()
+            assert len(resp_json) == 1
+            mappings = next(iter(resp_json.values()))['mappings']
+
+            # mapping中可能引用了自定义的分析器，需要同时复制analysis设置
+            body = { 'mappings': mappings }
+            analysis = self.get_settings().get('analysis')
+            if analysis:
+                body['settings'] = { 'analysis': analysis }
+
+            resp = requests.put(f'{target_index.host}/{target_index.index_name}', json=body)
+            if resp.status_code not in SUCCESS_CODE:
+                raise UnknownError(resp)
+
+        old_settings = target_index.get_settings()
+        target_index.update_settings({ 'refresh_interval': '-1', 'number_of_replicas': 0 })
+
+        try:
+            if transform is None:
+                num_copied = self._reindex_to(target_index)
+            else:
+                def _copy_slice(slice_id: int) -> int:
+                    return self._copy_slice_to(target_index, transform, slice_id, num_slices, page_size)
+
+                with ThreadPoolExecutor(max_workers=num_slices) as executor:
+                    num_copied = sum(executor.map(_copy_slice, range(num_slices)))
+        finally:
+            target_index.update_settings({
+                'refresh_interval': old_settings.get('refresh_interval'),
+                'number_of_replicas': old_settings.get('number_of_replicas'),
+            })
+            target_index.refresh()
+
+        return num_copied
+
+    def _reindex_to(self, target_index: 'EsIndex', poll_interval: float = 1.0) -> int:
+        """
+        以后台任务的形式执行_reindex，每隔poll_interval秒查询一次任务状态，直到任务完成。
+        这样不会因为复制耗时过长而导致HTTP请求超时。
+        """
+        resp = requests.post(url=f'{self.host}/_reindex',
+                             params={ 'slices': 'auto', 'wait_for_completion': 'false', 'refresh': 'false' },
+                             json={
+                                 'source': { 'index': self.index_name },
+                                 'dest': { 'index': target_index.index_name },
+                             })
+
+        if resp.status_code not in SUCCESS_CODE:
+            raise UnknownError(resp)
+
+        task_id = resp.json()['task']
+
+        while True:
+            resp = requests.get(url=f'{self.host}/_tasks/{task_id}')
+
+            if resp.status_code not in SUCCESS_CODE:
+                raise UnknownError(resp)
+
+            resp_json = resp.json()
+            if resp_json.get('completed'):
+                break
+
+            time.sleep(poll_interval)
+
+        if resp_json.get('error'):
+            raise UnknownError(resp)
+
+        result = resp_json.get('response', {})
+        if result.get('failures'):
+            raise BulkError(result['failures'])
+
+        return result.get('created', 0) + result.get('updated', 0)
+
+    def _copy_slice_to(self,
+                       target_index: 'EsIndex',
+                       transform: typing.Callable[[dict], typing.Optional[dict]],
+                       slice_id: int,
+                       num_slices: int,
+                       page_size: int) -> int:
+        num_copied = 0
+        batch = []
+
+        iter_ = self.scroll_search(
+            query={ 'match_all': {} },
+            page_size=page_size,
+            slice_id=slice_id,
+            num_slices=num_slices,
+        )
+        for entry in iter_:
+            _id = entry['_id']
+            new_entry = transform(entry)
+            if new_entry is None:
+                continue
+
+            if not new_entry.get('_id') and not new_entry.get('id'):
+                new_entry['_id'] = _id
+            batch.append(new_entry)
+
+            if len(batch) >= page_size:
+                num_copied += len(target_index.bulk_save(batch))
+                batch = []
+
+        if batch:
+            num_copied += len(target_index.bulk_save(batch))
+
+        return num_copied
+
     def create_mapping(self, properties: dict, delete_index: bool = False):
         """
         创建mapping。可以指定创建前是否删除索引。支持以下特殊mapping：
@@ -393,3 +650,202 @@ class EsIndex:
             entries.append(formatted_entry)
             
         return entries
+
+
+class EsWriteSession:
+    def __init__(self,
+                 index: EsIndex,
+                 batch_size: int = 500,
+                 refresh_interval: float = 1.0,
+                 use_wait_for: bool = False):
+        """
+        批量写入会话，可以被多个线程共享。
+
+        写入的文档先放入缓冲区，缓冲区满batch_size时，或每隔refresh_interval秒，通过一次_bulk请求写入ES。
+        写入时指定refresh=True不会立即刷新索引，而是合并为每个间隔（或每个批次）至多一次刷新；
+        需要确认写入可被搜索时，调用wait_visible()等待下一次刷新完成。
+
+        use_wait_for为真时，不发送单独的_refresh请求，而是在_bulk请求上使用refresh=wait_for，等待ES自身的定期刷新。
+
+        写入失败后，未写入的文档保留在缓冲区中，会话的其他调用都将抛出该错误，直到调用flush()重试成功。
+
+        用法：
+            with index.write_session() as session:
+                session.save_one(entry)
+                session.wait_visible()
+        """
+        assert batch_size > 0 and refresh_interval > 0
+
+        self.index = index
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.use_wait_for = use_wait_for
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._buffer: list[dict] = []
+        self._write_seq = 0
+        self._visible_seq = 0
+        self._refresh_requested = False
+        self._closed = False
+        self._error: typing.Optional[BaseException] = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _add(self, entry: dict, refresh: bool) -> typing.Union[str, int]:
+        _id = entry.get('_id') or entry.get('id')
+        assert _id
+
+        with self._cond:
+            self._check_error()
+            assert not self._closed
+
+            self._buffer.append(entry)
+            self._write_seq += 1
+            if refresh:
+                self._refresh_requested = True
+            full = len(self._buffer) >= self.batch_size
+
+        if full:
+            self._flush()
+
+        return _id
+
+    def insert_one(self, entry: dict, refresh: bool = False) -> str:
+        """
+        新增一个文档。该文档无需提供_id，将在本地生成新的_id并返回。
+
+        refresh为真时，该文档将在下一次合并刷新后可被搜索。
+        """
+        entry = dict(entry)
+        assert not _extract_entry_id(entry)
+
+        entry['_id'] = uuid.uuid4().hex
+        return self._add(entry, refresh)
+
+    def save_one(self, entry: dict, refresh: bool = False) -> typing.Union[str, int]:
+        """
+        新增一个文档。该文档必须提供_id，将覆盖已有_id的文档。
+
+        refresh为真时，该文档将在下一次合并刷新后可被搜索。
+        """
+        return self._add(dict(entry), refresh)
+
+    def _flush(self):
+        """
+        将缓冲区写入ES；如果有刷新请求，至多刷新一次。
+
+        写入失败时，未写入的文档放回缓冲区，刷新请求保持不变，并记录错误、唤醒等待的线程，
+        此后会话的所有调用都将抛出该错误，直到flush()重试成功。
+        """
+        with self._flush_lock:
+            with self._cond:
+                self._check_error()
+                buffer, self._buffer = self._buffer, []
+                seq = self._write_seq
+                refresh_requested, self._refresh_requested = self._refresh_requested, False
+
+            try:
+                if buffer:
+                    if refresh_requested and self.use_wait_for:
+                        self.index.bulk_save(buffer, refresh='wait_for')
+                    else:
+                        self.index.bulk_save(buffer)
+
+                if refresh_requested and not (buffer and self.use_wait_for):
+                    self.index.refresh()
+            except BaseException as e:
+                with self._cond:
+                    self._buffer[:0] = buffer
+                    self._refresh_requested = self._refresh_requested or refresh_requested
+                    self._error = e
+                    self._cond.notify_all()
+                raise
+
+            with self._cond:
+                if refresh_requested:
+                    self._visible_seq = max(self._visible_seq, seq)
+                    self._cond.notify_all()
+
+    def flush(self):
+        """
+        立即写入缓冲区中的文档。
+
+        如果此前的写入失败，清除错误并重试，成功后恢复后台的定期写入；再次失败时抛出异常，文档仍保留在缓冲区中。
+        close()抛出异常后也可以调用flush()写入剩余的文档。
+        """
+        with self._cond:
+            failed = self._error is not None
+
+        if failed:
+            # 出错后后台线程会退出
+            self._thread.join()
+            with self._cond:
+                self._error = None
+
+        self._flush()
+
+        with self._cond:
+            if not self._closed and not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._error is not None,
+                                    timeout=self.refresh_interval)
+                closed = self._closed
+
+            try:
+                self._flush()
+            except BaseException:
+                # 错误已由_flush记录
+                return
+
+            if closed:
+                return
+
+    def wait_visible(self, timeout: typing.Optional[float] = None) -> bool:
+        """
+        等待此前写入的所有文档可被搜索。多个线程的等待会合并为同一次刷新。
+
+        超时返回False。
+        """
+        with self._cond:
+            self._check_error()
+
+            target = self._write_seq
+            if self._visible_seq >= target:
+                return True
+
+            self._refresh_requested = True
+            visible = self._cond.wait_for(lambda: self._visible_seq >= target or self._error is not None,
+                                          timeout=timeout)
+            self._check_error()
+
+            return visible
+
+    def close(self):
+        """
+        写入缓冲区中剩余的文档并结束会话。
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._thread.join()
+        self._check_error()
+
+    def __enter__(self) -> 'EsWriteSession':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,40 @@
+import importlib
+import types
+import typing
+
+
+class LazyModule(types.ModuleType):
+    """
+    延迟导入的模块代理。
+
+    只有在第一次访问其属性时才真正导入对应模块（以及submodules中列出的子模块），
+    之后的属性访问直接转发给已导入的模块。
+    """
+    def __init__(self, name: str, submodules: typing.Iterable[str] = ()):
+        super().__init__(name)
+        self.__dict__['_lazy_submodules'] = tuple(submodules)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__['_lazy_module']
+
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            for submodule in self.__dict__['_lazy_submodules']:
+                importlib.import_module(submodule)
+            self.__dict__['_lazy_module'] = module
+
+        return module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self) -> list[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        if self.__dict__['_lazy_module'] is None:
+            return f"<lazy module '{self.__name__}' (not loaded)>"
+        else:
+            return repr(self.__dict__['_lazy_module'])
+
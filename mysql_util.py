@@ -64,12 +64,43 @@ class MySQLTable:
         self.cursor = conn.cursor()
         self.table_name = table_name
         self.primary_key = primary_key
+        self._column_names: typing.Optional[list[str]] = None
 
     def commit(self):
         self.conn.commit()
 
+    def clone(self) -> 'MySQLTable':
+        """
+        使用一个新的数据库连接（连接参数与当前连接相同，不包括SSL设置）创建同一张表的MySQLTable。
+
+        pymysql的连接不是线程安全的，在其他线程中访问同一张表时应使用clone得到的对象。
+        """
+        conn = pymysql.connect(
+            host=self.conn.host,
+            user=self.conn.user,
+            password=self.conn.password,
+            port=self.conn.port,
+            database=self.conn.db,
+            charset=self.conn.charset,
+            cursorclass=self.conn.cursorclass,
+            autocommit=self.conn.autocommit_mode,
+        )
+        return MySQLTable(conn=conn, table_name=self.table_name, primary_key=self.primary_key)
+
     def drop(self):
         self.cursor.execute(f'DROP TABLE IF EXISTS {self.table_name}')
+        self._column_names = None
+
+    def get_column_names(self) -> list[str]:
+        """
+        返回表中可写入的列名（不包括生成列）。结果会被缓存，表结构变化后需要重新创建MySQLTable。
+        """
+        if self._column_names is None:
+            self.cursor.execute(f'SHOW COLUMNS FROM {self.table_name}')
+            self._column_names = [column['Field'] for column in self.cursor.fetchall()
+                                  if 'GENERATED' not in (column['Extra'] or '').upper()]
+
+        return list(self._column_names)
 
     def clear(self):
         self.cursor.execute(f'TRUNCATE TABLE {self.table_name}')
@@ -92,23 +123,83 @@ class MySQLTable:
         self.cursor.execute(sql, values)
 
     def save_one(self, entry: dict):
-        id_ = entry[self.primary_key]
-        self.delete_by_id(id_)
-        self.insert_one(entry)
+        """
+        保存条目，将覆盖主键相同的条目（未提供的字段恢复为默认值）。
 
-    def update_one(self, entry: dict):
-        id_ = entry[self.primary_key]
-        try:
-            exist_entry = self.get_by_id(id_)
-        except EntryNotFoundError:
-            exist_entry = dict()
+        通过一条INSERT ... ON DUPLICATE KEY UPDATE语句完成：提供的字段写入新值，其余字段设为DEFAULT(col)。
+        不会先删除再插入，因此不会出现条目暂时缺失的情况，也不会触发删除触发器或外键的级联删除。
+        """
+        assert self.primary_key in entry
+
+        field_names = list(entry.keys())
+        default_fields = [key for key in self.get_column_names() if key not in entry]
+        sql = self._build_upsert_sql(field_names, default_fields)
+
+        self.cursor.execute(sql, list(entry.values()))
+
+    def _build_upsert_sql(self, field_names: list[str], default_fields: typing.Sequence[str] = ()) -> str:
+        part1 = ', '.join(field_names)
+        part2 = ', '.join(['%s'] * len(field_names))
+        update_fields = [key for key in field_names if key != self.primary_key]
+        updates = [f'{key} = VALUES({key})' for key in update_fields] + [f'{key} = DEFAULT({key})' for key in default_fields]
+        part3 = ', '.join(updates or [f'{self.primary_key} = VALUES({self.primary_key})'])
+
+        return f'INSERT INTO {self.table_name} ({part1}) VALUES ({part2}) ON DUPLICATE KEY UPDATE {part3}'
+
+    def _prepare_upsert_entry(self, entry: dict, skip_falsy: bool) -> dict:
+        assert entry.get(self.primary_key) is not None
+
+        if skip_falsy:
+            return {key: value for key, value in entry.items() if value or key == self.primary_key}
+        else:
+            return dict(entry)
+
+    def update_one(self, entry: dict, skip_falsy: bool = True):
+        """
+        更新条目：条目存在时只修改提供的字段，不存在时新增。
+
+        skip_falsy为真时，忽略值为假（None、0、空字符串等）的字段，即不会用假值覆盖已有的值。
+        通过一条INSERT ... ON DUPLICATE KEY UPDATE语句完成，只需一次往返。
+        """
+        entry = self._prepare_upsert_entry(entry, skip_falsy)
+        sql = self._build_upsert_sql(list(entry.keys()))
+
+        self.cursor.execute(sql, list(entry.values()))
+
+    def update_many(self, entries: typing.Iterable[dict], skip_falsy: bool = True):
+        """
+        批量更新条目，语义与update_one相同，按输入的顺序写入。
 
-        new_entry = exist_entry
-        for key, value in entry.items():
-            if value:
-                new_entry[key] = value
+        相邻且字段集合相同的条目合并为一条多行的INSERT ... ON DUPLICATE KEY UPDATE语句。
+        """
+        field_names: typing.Optional[tuple[str, ...]] = None
+        values_list: list[list] = []
 
-        self.save_one(new_entry)
+        for entry in entries:
+            entry = self._prepare_upsert_entry(entry, skip_falsy)
+
+            if tuple(entry.keys()) != field_names:
+                if values_list:
+                    self.cursor.executemany(self._build_upsert_sql(list(field_names)), values_list)
+                field_names, values_list = tuple(entry.keys()), []
+
+            values_list.append(list(entry.values()))
+
+        if values_list:
+            self.cursor.executemany(self._build_upsert_sql(list(field_names)), values_list)
+
+    def update_by_id(self, id_: int, fields: dict) -> int:
+        """
+        根据主键修改条目的指定字段，不会新增条目，返回受影响的行数。
+
+        注意：MySQL默认只统计值实际发生变化的行，条目不存在或值未变化时都返回0。
+        """
+        assert fields and self.primary_key not in fields
+
+        part = ', '.join([f'{key} = %s' for key in fields.keys()])
+        sql = f'UPDATE {self.table_name} SET {part} WHERE {self.primary_key} = %s'
+
+        return self.cursor.execute(sql, list(fields.values()) + [id_])
 
     def get_all(self, page_size: int = 1000, **conditions) -> typing.Iterable[dict]:
         last_id = -1
@@ -127,6 +218,42 @@ class MySQLTable:
                 last_id = entry[self.primary_key]
                 yield entry
 
+    def get_all_since(self,
+                      column: typing.Optional[str] = None,
+                      value=None,
+                      last_id=None,
+                      page_size: int = 1000) -> typing.Iterable[dict]:
+        """
+        按(column, 主键)的顺序，增量查询水位线(value, last_id)之后的所有条目，用于增量同步。
+
+        column默认为主键，也可以是更新时间等单调递增且非空的列。value为None时从头查询。
+        """
+        column = column or self.primary_key
+
+        if column == self.primary_key:
+            order_by = self.primary_key
+        else:
+            order_by = f'{column}, {self.primary_key}'
+
+        while True:
+            if value is None:
+                where, params = '', []
+            elif column == self.primary_key:
+                where, params = f'WHERE {column} > %s', [value]
+            else:
+                where = f'WHERE {column} > %s OR ({column} = %s AND {self.primary_key} > %s)'
+                params = [value, value, last_id]
+
+            sql = f'SELECT * FROM {self.table_name} {where} ORDER BY {order_by} LIMIT %s'
+            self.cursor.execute(sql, params + [page_size])
+            entries = self.cursor.fetchall()
+            if not entries:
+                break
+            for entry in entries:
+                value = entry[column]
+                last_id = entry[self.primary_key]
+                yield entry
+
     def get_by_id(self, id_: int) -> dict:
         sql = f'SELECT * FROM {self.table_name} WHERE {self.primary_key} = %s'
         self.cursor.execute(sql, [id_])
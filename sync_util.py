@@ -0,0 +1,209 @@
+from .es_util import EsIndex
+from .mysql_util import MySQLTable
+from .logging_util import info as _log_info
+from .thread_util import iter_in_background as _iter_in_background
+import datetime
+import decimal
+import json
+import os
+import typing
+
+
+class Watermark(typing.NamedTuple):
+    """
+    增量同步的水位线：已同步的最后一条记录的(column, 主键)值。
+    """
+    column: str
+    value: typing.Any = None
+    last_id: typing.Any = None
+
+
+def _encode_watermark_value(value) -> typing.Any:
+    """
+    将水位线的值编码为JSON可以精确表示的形式。日期、时间、Decimal等以{'type': 类型, 'value': 字符串}的形式保存。
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, datetime.datetime):
+        return { 'type': 'datetime', 'value': value.isoformat() }
+    elif isinstance(value, datetime.date):
+        return { 'type': 'date', 'value': value.isoformat() }
+    elif isinstance(value, datetime.timedelta):
+        return { 'type': 'timedelta', 'value': [value.days, value.seconds, value.microseconds] }
+    elif isinstance(value, decimal.Decimal):
+        return { 'type': 'decimal', 'value': str(value) }
+    elif isinstance(value, bytes):
+        return { 'type': 'bytes', 'value': value.hex() }
+    else:
+        raise TypeError(f'Unsupported watermark value: {value!r}')
+
+
+def _decode_watermark_value(obj) -> typing.Any:
+    if not isinstance(obj, dict):
+        return obj
+
+    type_, value = obj['type'], obj['value']
+
+    if type_ == 'datetime':
+        return datetime.datetime.fromisoformat(value)
+    elif type_ == 'date':
+        return datetime.date.fromisoformat(value)
+    elif type_ == 'timedelta':
+        return datetime.timedelta(days=value[0], seconds=value[1], microseconds=value[2])
+    elif type_ == 'decimal':
+        return decimal.Decimal(value)
+    elif type_ == 'bytes':
+        return bytes.fromhex(value)
+    else:
+        raise AssertionError
+
+
+def load_watermark(path: str, column: str) -> Watermark:
+    """
+    读取持久化的水位线。如果文件不存在，返回空水位线（即从头同步）。
+
+    如果文件中记录的列与column不一致，抛出AssertionError。
+    """
+    if not os.path.exists(path):
+        return Watermark(column=column)
+
+    with open(path, 'r', encoding='utf-8') as fp:
+        obj = json.load(fp)
+
+    assert obj['column'] == column
+
+    return Watermark(column=obj['column'],
+                     value=_decode_watermark_value(obj['value']),
+                     last_id=_decode_watermark_value(obj['last_id']))
+
+
+def _watermark_to_json(watermark: Watermark) -> dict:
+    return {
+        'column': watermark.column,
+        'value': _encode_watermark_value(watermark.value),
+        'last_id': _encode_watermark_value(watermark.last_id),
+    }
+
+
+def save_watermark(path: str, watermark: Watermark):
+    """
+    持久化水位线。先写入临时文件再替换，保证文件不会处于写了一半的状态。
+    """
+    obj = _watermark_to_json(watermark)
+
+    tmp_path = path + '.tmp'
+
+    with open(tmp_path, 'w', encoding='utf-8') as fp:
+        json.dump(obj, fp, ensure_ascii=False)
+
+    os.replace(tmp_path, path)
+
+
+class MySQL2EsSync:
+    def __init__(self, *,
+                 table: MySQLTable,
+                 index: EsIndex,
+                 watermark_path: str,
+                 watermark_column: typing.Optional[str] = None,
+                 transform: typing.Optional[typing.Callable[[dict], typing.Optional[dict]]] = None,
+                 batch_size: int = 1000,
+                 queue_size: int = 4,
+                 refresh: typing.Union[bool, str] = False,
+                 reader_table: typing.Optional[MySQLTable] = None):
+        """
+        将MySQL表增量同步到ES索引。
+
+        读取线程从持久化的水位线处按(watermark_column, 主键)的顺序读取新记录，按batch_size分批放入有界队列；
+        写入方从队列中取出批次，经过transform转换后通过_bulk批量写入ES，每个批次写入成功后更新水位线。
+        队列满时读取线程阻塞等待，从而对读取端形成反压。
+
+        watermark_column默认为主键；如果按更新时间同步，该列必须非空且在更新时单调递增。
+        transform返回None时跳过该条记录；返回的文档如果没有_id或id，使用原记录的主键作为_id。
+
+        pymysql的连接不是线程安全的，而读取在单独的线程中进行，因此读取线程使用独立的连接：
+        默认通过table.clone()新建连接（同步结束后关闭），也可以通过reader_table指定。
+        transform在主线程中执行，可以安全地使用table所在的连接查询其他表。
+        reader_table不能与主线程共享连接。
+        """
+        assert batch_size > 0 and queue_size > 0
+
+        self.table = table
+        self.index = index
+        self.watermark_path = watermark_path
+        self.watermark_column = watermark_column or table.primary_key
+        self.transform = transform
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.refresh = refresh
+        self.reader_table = reader_table
+
+    def _read_batches(self, reader_table: MySQLTable, watermark: Watermark) -> typing.Iterator[list[dict]]:
+        entries = reader_table.get_all_since(column=watermark.column,
+                                             value=watermark.value,
+                                             last_id=watermark.last_id,
+                                             page_size=self.batch_size)
+        batch = []
+
+        for entry in entries:
+            batch.append(entry)
+
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _to_doc(self, entry: dict) -> typing.Optional[dict]:
+        if self.transform:
+            doc = self.transform(dict(entry))
+            if doc is None:
+                return None
+        else:
+            doc = dict(entry)
+
+        if not doc.get('_id') and not doc.get('id'):
+            doc['_id'] = entry[self.table.primary_key]
+
+        return doc
+
+    def run(self) -> int:
+        """
+        执行一次增量同步，返回同步的记录数量。
+        """
+        start_watermark = load_watermark(self.watermark_path, self.watermark_column)
+        _log_info(f'Sync {self.table.table_name} -> {self.index.index_name} from {start_watermark}')
+
+        if self.reader_table is not None:
+            reader_table = self.reader_table
+        else:
+            reader_table = self.table.clone()
+
+        batches = _iter_in_background(lambda: self._read_batches(reader_table, start_watermark),
+                                      queue_size=self.queue_size)
+        num_synced = 0
+
+        try:
+            for batch in batches:
+                last_entry = batch[-1]
+                watermark = Watermark(column=self.watermark_column,
+                                      value=last_entry[self.watermark_column],
+                                      last_id=last_entry[self.table.primary_key])
+                # 在写入ES之前检查水位线能否持久化
+                _watermark_to_json(watermark)
+
+                docs = [doc for doc in map(self._to_doc, batch) if doc is not None]
+                self.index.bulk_save(docs, refresh=self.refresh)
+
+                save_watermark(self.watermark_path, watermark)
+
+                num_synced += len(batch)
+                _log_info(f'Synced {num_synced} entries, watermark: {watermark}')
+        finally:
+            # 先结束读取线程，再关闭其使用的连接
+            batches.close()
+
+            if reader_table is not self.reader_table:
+                reader_table.conn.close()
+
+        return num_synced
@@ -0,0 +1,56 @@
+import queue
+import threading
+import typing
+
+_T = typing.TypeVar('_T')
+
+_PRODUCE_END = object()
+
+
+def iter_in_background(produce: typing.Callable[[], typing.Iterable[_T]], queue_size: int) -> typing.Iterator[_T]:
+    """
+    在后台线程中迭代produce()，通过容量为queue_size的有界队列依次返回其中的元素。
+
+    队列满时后台线程阻塞等待，从而对生产端形成反压；后台线程中抛出的异常会在消费端重新抛出。
+    消费端提前结束迭代（break、异常或关闭生成器）时，后台线程会在放入下一个元素时退出。
+    """
+    assert queue_size > 0
+
+    out_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run():
+        try:
+            for item in produce():
+                if not _put(item):
+                    return
+        except BaseException as e:
+            _put(e)
+        else:
+            _put(_PRODUCE_END)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = out_queue.get()
+
+            if item is _PRODUCE_END:
+                break
+            elif isinstance(item, BaseException):
+                raise item
+
+            yield item
+    finally:
+        stop_event.set()
+        thread.join()
@@ -1,23 +1,31 @@
-# ==========Torch==========
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import torch.optim as optim
-from torch import Tensor
-from torch.utils.data import Dataset, DataLoader
+# Torch、NumPy、Pandas、tqdm等重型依赖均为延迟导入：只有在第一次访问对应名称时才真正导入。
+# 注意：`from torch_imports import *`会访问__all__中的所有名称，从而导入全部依赖。
+# 本文件不使用包内的相对导入，可以单独复制使用。
+import importlib as _importlib
 
-IntTensor = Tensor
-FloatTensor = Tensor
-BoolTensor = Tensor
+# ==========Torch==========
+_TORCH_ATTRS = {
+    'torch': ('torch', None),
+    'nn': ('torch.nn', None),
+    'F': ('torch.nn.functional', None),
+    'optim': ('torch.optim', None),
+    'Tensor': ('torch', 'Tensor'),
+    'Dataset': ('torch.utils.data', 'Dataset'),
+    'DataLoader': ('torch.utils.data', 'DataLoader'),
+    'IntTensor': ('torch', 'Tensor'),
+    'FloatTensor': ('torch', 'Tensor'),
+    'BoolTensor': ('torch', 'Tensor'),
+}
 
 # ==========NumPy Pandas==========
-import numpy as np
-from numpy import ndarray
-import pandas as pd
-
-IntArray = ndarray
-FloatArray = ndarray
-BoolArray = ndarray
+_NUMPY_PANDAS_ATTRS = {
+    'np': ('numpy', None),
+    'ndarray': ('numpy', 'ndarray'),
+    'pd': ('pandas', None),
+    'IntArray': ('numpy', 'ndarray'),
+    'FloatArray': ('numpy', 'ndarray'),
+    'BoolArray': ('numpy', 'ndarray'),
+}
 
 # ==========Standard==========
 import random
@@ -31,4 +39,36 @@ import math
 import sys
 
 # ==========Other==========
-from tqdm import tqdm
+_OTHER_ATTRS = {
+    'tqdm': ('tqdm', 'tqdm'),
+}
+
+_LAZY_ATTRS = {**_TORCH_ATTRS, **_NUMPY_PANDAS_ATTRS, **_OTHER_ATTRS}
+
+
+def __getattr__(name: str):
+    # PEP 562：第一次访问时才导入，结果缓存到模块的全局变量中，之后不再经过__getattr__
+    if name not in _LAZY_ATTRS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    module_name, attr_name = _LAZY_ATTRS[name]
+    value = _importlib.import_module(module_name)
+
+    if attr_name is not None:
+        value = getattr(value, attr_name)
+
+    globals()[name] = value
+    return value
+
+
+__all__ = [
+    *_LAZY_ATTRS,
+    'random', 'pprint',
+    'List', 'Dict', 'Set', 'Tuple', 'Iterator', 'Iterable', 'Callable', 'Optional', 'Union',
+    'defaultdict', 'deque', 'namedtuple', 'dataclass', 'datetime', 'date', 'timedelta',
+    'os', 'math', 'sys',
+]
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
@@ -1,12 +1,26 @@
+from __future__ import annotations
+
 from .logging_util import info as _log_info
 from .logging_util import warn as _log_warn
+from .lazy_util import LazyModule as _LazyModule
+from .thread_util import iter_in_background as _iter_in_background
 import typing
 import math
-import numpy as np
-import torch
-import torch.backends.cudnn
 import random
 
+if typing.TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+    DtypeMap = typing.Dict[typing.Union[np.dtype, type, torch.dtype], torch.dtype]
+else:
+    # 延迟导入，只有在第一次使用时才导入torch和numpy
+    np = _LazyModule('numpy')
+    torch = _LazyModule('torch', submodules=['torch.backends.cudnn', 'torch.distributed', 'torch.utils.data'])
+
+    # 运行时不为类型别名导入numpy和torch，dtype以typing.Any表示
+    DtypeMap = typing.Dict[typing.Any, typing.Any]
+
 _device: typing.Optional[torch.device] = None
 
 
@@ -35,7 +49,138 @@ def to_device(obj):
     return obj.to(device=_device)
 
 
-def to_tensor(obj) -> torch.Tensor:
+def _map_dtype(tensor: torch.Tensor, src_dtypes: tuple, dtype_map: typing.Optional[DtypeMap]) -> torch.Tensor:
+    """
+    按dtype_map转换张量的dtype。依次尝试src_dtypes中的键（如np.dtype('float64')与np.float64）以及张量自身的dtype。
+    """
+    if not dtype_map:
+        return tensor
+
+    for key in (*src_dtypes, tensor.dtype):
+        try:
+            if key in dtype_map:
+                return tensor.to(dtype=dtype_map[key])
+        except TypeError:
+            pass
+
+    return tensor
+
+
+def _leaf_to_tensor(obj, dtype_map: typing.Optional[DtypeMap]) -> torch.Tensor:
+    if isinstance(obj, torch.Tensor):
+        return _map_dtype(obj, (), dtype_map)
+    elif isinstance(obj, np.ndarray):
+        try:
+            out_tensor = torch.from_numpy(obj)
+        except ValueError:
+            # 负步长等torch不支持的内存布局，需要复制为连续数组
+            out_tensor = torch.from_numpy(np.ascontiguousarray(obj))
+        except TypeError:
+            # torch不支持的dtype（如uint32、object）只能复制
+            out_tensor = torch.tensor(obj.astype(np.int64) if obj.dtype.kind in 'iu' else obj)
+        return _map_dtype(out_tensor, (obj.dtype, obj.dtype.type), dtype_map)
+    elif isinstance(obj, (bool, int, float, np.generic)):
+        return _map_dtype(torch.as_tensor(obj), (type(obj),), dtype_map)
+    else:
+        raise AssertionError
+
+
+def _rebuild_sequence(obj: typing.Union[list, tuple], items: typing.Iterable):
+    """
+    以obj的类型重新构造序列，namedtuple需要按位置参数构造。
+    """
+    if hasattr(obj, '_fields'):
+        return type(obj)(*items)
+    else:
+        return type(obj)(items)
+
+
+def _convert_nested(obj, leaves: list, dtype_map: typing.Optional[DtypeMap]):
+    """
+    将嵌套结构中的每个叶子转换为张量并收集到leaves中，返回以叶子下标代替叶子的结构。
+    """
+    if isinstance(obj, dict):
+        return {key: _convert_nested(value, leaves, dtype_map) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        if any(isinstance(item, (np.ndarray, torch.Tensor, dict, list, tuple)) for item in obj):
+            return _rebuild_sequence(obj, [_convert_nested(item, leaves, dtype_map) for item in obj])
+        else:
+            obj = np.asarray(obj)
+
+    leaves.append(_leaf_to_tensor(obj, dtype_map))
+    return len(leaves) - 1
+
+
+def _fill_nested(structure, leaves: list):
+    if isinstance(structure, dict):
+        return {key: _fill_nested(value, leaves) for key, value in structure.items()}
+    elif isinstance(structure, (list, tuple)):
+        return _rebuild_sequence(structure, [_fill_nested(item, leaves) for item in structure])
+    else:
+        return leaves[structure]
+
+
+_SMALL_TENSOR_BYTES = 1 << 20
+
+
+def _batch_to_device(tensors: list[torch.Tensor]) -> list[torch.Tensor]:
+    """
+    将多个张量一起拷贝到设备上。
+
+    小张量（不超过_SMALL_TENSOR_BYTES）按dtype打包进一个连续缓冲区，只发起一次拷贝，再在设备上切分；
+    大张量以及需要梯度的张量（打包会切断计算图）单独拷贝，大张量不额外复制到锁页内存。
+    """
+    use_pin_memory = _device.type == 'cuda'
+    out = list(tensors)
+    groups: dict[torch.dtype, list[int]] = dict()
+
+    for i, t in enumerate(tensors):
+        if t.device == _device:
+            continue
+
+        if t.numel() * t.element_size() <= _SMALL_TENSOR_BYTES and t.device.type == 'cpu' and not t.requires_grad:
+            groups.setdefault(t.dtype, []).append(i)
+        else:
+            out[i] = t.to(device=_device, non_blocking=t.is_pinned())
+
+    for dtype, idxs in groups.items():
+        if len(idxs) == 1:
+            out[idxs[0]] = tensors[idxs[0]].to(device=_device)
+            continue
+
+        flat = torch.empty(sum(tensors[i].numel() for i in idxs), dtype=dtype, pin_memory=use_pin_memory)
+        torch.cat([tensors[i].reshape(-1) for i in idxs], out=flat)
+        flat = flat.to(device=_device, non_blocking=use_pin_memory)
+
+        pos = 0
+        for i in idxs:
+            numel = tensors[i].numel()
+            out[i] = flat[pos: pos + numel].view(tensors[i].shape)
+            pos += numel
+
+    return out
+
+
+def to_tensor(obj, *, keep_dtype: bool = False, dtype_map: typing.Optional[DtypeMap] = None):
+    """
+    将对象转换为张量，如果设置了设备，则同时拷贝到设备上。
+
+    默认模式下，浮点数组统一转换为float32，其余数组统一转换为int64。
+
+    当keep_dtype为真时：
+    1. 尽可能与NumPy数组共享内存（torch.from_numpy），并保留原有dtype；
+    2. 可以通过dtype_map显式指定dtype的映射，如{np.float64: torch.float32}；
+    3. 支持由dict、list、tuple嵌套组成的结构，一次调用转换其中所有数组，且同一dtype的张量合并为一次设备拷贝。
+    """
+    if keep_dtype:
+        leaves = []
+        structure = _convert_nested(obj, leaves, dtype_map)
+
+        if _device:
+            leaves = _batch_to_device(leaves)
+
+        return _fill_nested(structure, leaves)
+
     if isinstance(obj, int):
         out_tensor = torch.tensor(obj, dtype=torch.int64)
     elif isinstance(obj, float):
@@ -60,11 +205,23 @@ def to_tensor(obj) -> torch.Tensor:
         return to_device(out_tensor)
 
 
-def to_numpy(obj: typing.Union[torch.Tensor, np.ndarray]) -> np.ndarray:
+def to_numpy(obj):
+    """
+    将张量转换为NumPy数组，支持由dict、list、tuple嵌套组成的结构。
+
+    对于不需要梯度的CPU张量，返回的数组与张量共享内存，不会发生复制。
+    """
     if isinstance(obj, np.ndarray):
         return obj
     elif isinstance(obj, torch.Tensor):
-        return obj.detach().cpu().numpy()
+        if obj.device.type == 'cpu' and not obj.requires_grad:
+            return obj.numpy()
+        else:
+            return obj.detach().cpu().numpy()
+    elif isinstance(obj, dict):
+        return {key: to_numpy(value) for key, value in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return _rebuild_sequence(obj, [to_numpy(item) for item in obj])
     else:
         raise AssertionError
 
@@ -103,3 +260,313 @@ def src_tgt_idx_batch_generator(num_samples_S: int,
 
     for batch_idxs in idx_batch_generator(num_samples=union_num_samples, batch_size=batch_size):
         yield src_idxs[batch_idxs], tgt_idxs[batch_idxs]
+
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """
+    splitmix64的混淆函数，输入输出均为uint64数组。
+    """
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return x ^ (x >> np.uint64(31))
+
+
+def _mix_seed(*values: int) -> int:
+    """
+    将多个整数（如seed与epoch）依次混淆为一个64位种子，不同的组合几乎不会得到相同的结果。
+    """
+    h = np.zeros(1, dtype=np.uint64)
+
+    for value in values:
+        h = _mix64(h ^ np.uint64(value & 0xffffffffffffffff))
+
+    return int(h[0])
+
+
+class _FeistelPermutation:
+    """
+    [0, num_samples)上的伪随机双射，基于Feistel网络与cycle walking实现。
+
+    无需生成完整的排列，每个位置的映射结果可以独立计算，内存占用只与查询的位置数量有关。
+    """
+    def __init__(self, num_samples: int, seed: int, num_rounds: int = 4):
+        self.num_samples = num_samples
+        self.half_bits = max(1, math.ceil(math.log2(max(num_samples, 2)) / 2))
+        self.half_mask = np.uint64((1 << self.half_bits) - 1)
+
+        with np.errstate(over='ignore'):
+            base = _mix64(np.array([seed & 0xffffffffffffffff], dtype=np.uint64))[0]
+            self.keys = _mix64(np.arange(num_rounds, dtype=np.uint64) + base)
+
+    def _permute_domain(self, x: np.ndarray) -> np.ndarray:
+        shift = np.uint64(self.half_bits)
+        left = x >> shift
+        right = x & self.half_mask
+
+        with np.errstate(over='ignore'):
+            for key in self.keys:
+                left, right = right, left ^ (_mix64(right ^ key) & self.half_mask)
+
+        return (left << shift) | right
+
+    def __call__(self, positions: np.ndarray) -> np.ndarray:
+        x = self._permute_domain(np.asarray(positions, dtype=np.uint64))
+
+        # cycle walking：落在[num_samples, 2^(2*half_bits))的值继续置换，直到回到合法范围
+        out_of_range = x >= self.num_samples
+        while out_of_range.any():
+            x[out_of_range] = self._permute_domain(x[out_of_range])
+            out_of_range = x >= self.num_samples
+
+        return x.astype(np.int64)
+
+
+def _get_shard_info() -> tuple[int, int]:
+    """
+    根据分布式训练的rank与DataLoader的worker信息，计算当前进程的分片数量与分片编号。
+    """
+    num_shards, shard_id = 1, 0
+
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        num_shards = torch.distributed.get_world_size()
+        shard_id = torch.distributed.get_rank()
+
+    worker_info = torch.utils.data.get_worker_info()
+
+    if worker_info is not None:
+        shard_id = shard_id * worker_info.num_workers + worker_info.id
+        num_shards *= worker_info.num_workers
+
+    return num_shards, shard_id
+
+
+def _iter_position_blocks(num_samples: int,
+                          batch_size: int,
+                          discard_remain: bool,
+                          start_batch: int,
+                          num_shards: int,
+                          shard_id: int,
+                          block_size: int) -> typing.Iterator[tuple[np.ndarray, list[int]]]:
+    """
+    按块生成当前分片的批次位置（置换前的下标），每块包含若干个批次，返回(位置数组, 各批次的切分点)。
+
+    多个分片时，批次数量补齐（或在discard_remain时截断）为num_shards的整数倍，且每个批次都是完整的，
+    超出num_samples的位置回绕到开头，与DistributedSampler的做法一致，保证各分片的批次数量相同。
+    """
+    if discard_remain:
+        num_batches = num_samples // batch_size
+    else:
+        num_batches = math.ceil(num_samples / batch_size)
+
+    padded = num_shards > 1
+    if padded:
+        if discard_remain:
+            num_batches = num_batches // num_shards * num_shards
+        else:
+            num_batches = math.ceil(num_batches / num_shards) * num_shards
+
+    first_batch = start_batch + (shard_id - start_batch) % num_shards
+    batch_idxs = np.arange(first_batch, num_batches, num_shards, dtype=np.uint64)
+    batches_per_block = max(1, block_size // batch_size)
+    offsets = np.arange(batch_size, dtype=np.uint64)
+
+    for i in range(0, len(batch_idxs), batches_per_block):
+        block_batch_idxs = batch_idxs[i: i + batches_per_block]
+        positions = (block_batch_idxs[:, None] * np.uint64(batch_size) + offsets[None, :]).ravel()
+
+        if padded:
+            positions %= np.uint64(num_samples)
+            sizes = [batch_size] * len(block_batch_idxs)
+        else:
+            positions = positions[positions < num_samples]
+            sizes = [min(batch_size, num_samples - int(b) * batch_size) for b in block_batch_idxs]
+
+        yield positions, np.cumsum(sizes)[:-1].tolist()
+
+
+def stream_idx_batch_generator(num_samples: int,
+                               batch_size: int,
+                               discard_remain: bool = False,
+                               *,
+                               seed: int = 0,
+                               epoch: int = 0,
+                               start_batch: int = 0,
+                               num_shards: typing.Optional[int] = None,
+                               shard_id: typing.Optional[int] = None,
+                               block_size: int = 1 << 16) -> typing.Iterator[np.ndarray]:
+    """
+    流式的idx_batch_generator，适用于超大数据集。
+
+    使用伪随机双射代替np.random.permutation，不生成完整的排列，内存占用为O(block_size)。
+    每次置换block_size个位置（若干个批次），以摊薄NumPy调用的开销。
+    相同的seed和epoch总是得到相同的顺序；可以通过start_batch从指定批次处恢复。
+
+    第i个批次分配给编号为i % num_shards的分片。如果不指定num_shards和shard_id，
+    将根据分布式训练的rank与DataLoader的worker自动推断。
+    多个分片时，各分片的批次数量相同且每个批次都是完整的，少量样本会被重复使用（见_iter_position_blocks）。
+    """
+    if num_shards is None or shard_id is None:
+        num_shards, shard_id = _get_shard_info()
+
+    assert 0 <= shard_id < num_shards
+
+    perm = _FeistelPermutation(num_samples=num_samples, seed=_mix_seed(seed, epoch))
+
+    blocks = _iter_position_blocks(num_samples=num_samples,
+                                   batch_size=batch_size,
+                                   discard_remain=discard_remain,
+                                   start_batch=start_batch,
+                                   num_shards=num_shards,
+                                   shard_id=shard_id,
+                                   block_size=block_size)
+
+    for positions, split_points in blocks:
+        yield from np.split(perm(positions), split_points)
+
+
+def stream_src_tgt_idx_batch_generator(num_samples_S: int,
+                                       num_samples_T: int,
+                                       batch_size: int,
+                                       *,
+                                       seed: int = 0,
+                                       epoch: int = 0,
+                                       start_batch: int = 0,
+                                       num_shards: typing.Optional[int] = None,
+                                       shard_id: typing.Optional[int] = None,
+                                       block_size: int = 1 << 16) -> typing.Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    流式的src_tgt_idx_batch_generator，内存占用为O(block_size)。
+
+    较小的一方通过多轮不同的伪随机排列补齐到相同长度，而不是有放回地重采样。
+    """
+    if num_shards is None or shard_id is None:
+        num_shards, shard_id = _get_shard_info()
+
+    assert 0 <= shard_id < num_shards
+
+    union_num_samples = math.ceil(max(num_samples_S, num_samples_T) / batch_size) * batch_size
+
+    base_seed = _mix_seed(seed, epoch)
+    union_perm = _FeistelPermutation(num_samples=union_num_samples, seed=base_seed)
+
+    def _lookup(num: int, union_idxs: np.ndarray, salt: int) -> np.ndarray:
+        # 第r轮（union_idxs // num == r）使用同一个排列再加上该轮的偏移，对每一轮仍然是双射
+        perm = _FeistelPermutation(num_samples=num, seed=_mix_seed(base_seed, salt))
+        round_key = np.uint64(_mix_seed(base_seed, salt, num))
+        offsets = _mix64(union_idxs.astype(np.uint64) // np.uint64(num) ^ round_key) % np.uint64(num)
+
+        return (perm(union_idxs % num) + offsets.astype(np.int64)) % num
+
+    blocks = _iter_position_blocks(num_samples=union_num_samples,
+                                   batch_size=batch_size,
+                                   discard_remain=False,
+                                   start_batch=start_batch,
+                                   num_shards=num_shards,
+                                   shard_id=shard_id,
+                                   block_size=block_size)
+
+    for positions, split_points in blocks:
+        union_idxs = union_perm(positions)
+        src_idxs = np.split(_lookup(num_samples_S, union_idxs, 1), split_points)
+        tgt_idxs = np.split(_lookup(num_samples_T, union_idxs, 2), split_points)
+        yield from zip(src_idxs, tgt_idxs)
+
+
+class BatchLoader:
+    """
+    预取式批数据加载器。
+
+    根据idx_batch_generator生成的下标，对每个张量做一次向量化的index_select以组装批数据，
+    组装结果直接写入锁页内存（仅当设备为CUDA时），并由后台线程提前准备接下来的num_prefetch个批次，
+    在独立的CUDA流上以non_blocking的方式拷贝到设备上，从而与训练的计算重叠。
+    即使只使用CPU，批数据的组装也会与训练过程重叠。
+
+    每次迭代返回与输入顺序一致的张量元组。指定idx_generator时无法预知批次数量，len()将抛出TypeError。
+    """
+    def __init__(self,
+                 *arrays: typing.Union[torch.Tensor, np.ndarray],
+                 batch_size: int,
+                 discard_remain: bool = False,
+                 num_prefetch: int = 2,
+                 pin_memory: bool = True,
+                 idx_generator: typing.Optional[typing.Callable[[], typing.Iterable[np.ndarray]]] = None):
+        assert arrays and num_prefetch >= 1
+
+        self.tensors = [obj if isinstance(obj, torch.Tensor) else torch.from_numpy(np.ascontiguousarray(obj))
+                        for obj in arrays]
+        self.num_samples = len(self.tensors[0])
+        assert all(len(t) == self.num_samples for t in self.tensors)
+
+        self.batch_size = batch_size
+        self.discard_remain = discard_remain
+        self.num_prefetch = num_prefetch
+        self.pin_memory = pin_memory
+        self.idx_generator = idx_generator
+
+    def __len__(self) -> int:
+        if self.idx_generator:
+            raise TypeError('length of BatchLoader with a custom idx_generator is unknown')
+
+        if self.discard_remain:
+            return self.num_samples // self.batch_size
+        else:
+            return math.ceil(self.num_samples / self.batch_size)
+
+    def _iter_indices(self) -> typing.Iterable[np.ndarray]:
+        if self.idx_generator:
+            return self.idx_generator()
+        else:
+            return idx_batch_generator(num_samples=self.num_samples,
+                                       batch_size=self.batch_size,
+                                       discard_remain=self.discard_remain)
+
+    def _gather(self,
+                indices: np.ndarray,
+                use_pin_memory: bool,
+                copy_stream: typing.Optional[torch.cuda.Stream]) -> tuple[tuple[torch.Tensor, ...], typing.Optional[torch.cuda.Event]]:
+        """
+        组装一个批次。使用CUDA时，拷贝在copy_stream上发起，并返回拷贝完成的事件。
+        """
+        idx_tensor = torch.as_tensor(indices, dtype=torch.int64)
+        batch = []
+
+        for t in self.tensors:
+            if use_pin_memory and t.device.type == 'cpu':
+                out = torch.empty((len(idx_tensor), *t.shape[1:]), dtype=t.dtype, pin_memory=True)
+                torch.index_select(t, 0, idx_tensor, out=out)
+            else:
+                out = t.index_select(0, idx_tensor.to(t.device))
+
+            batch.append(out)
+
+        if copy_stream is not None:
+            with torch.cuda.stream(copy_stream):
+                batch = [out.to(device=_device, non_blocking=True) for out in batch]
+                copy_event = torch.cuda.Event()
+                copy_event.record(copy_stream)
+            return tuple(batch), copy_event
+        elif _device:
+            return tuple(out.to(device=_device) for out in batch), None
+        else:
+            return tuple(batch), None
+
+    def __iter__(self) -> typing.Iterator[tuple[torch.Tensor, ...]]:
+        use_cuda = _device is not None and _device.type == 'cuda'
+        use_pin_memory = self.pin_memory and use_cuda
+        copy_stream = torch.cuda.Stream(device=_device) if use_cuda else None
+
+        def _produce():
+            for indices in self._iter_indices():
+                yield self._gather(indices, use_pin_memory, copy_stream)
+
+        for batch, copy_event in _iter_in_background(_produce, queue_size=self.num_prefetch):
+            if copy_event is not None:
+                # 计算流等待该批次拷贝完成；record_stream告知缓存分配器这些张量也被计算流使用
+                compute_stream = torch.cuda.current_stream(_device)
+                compute_stream.wait_event(copy_event)
+                for t in batch:
+                    t.record_stream(compute_stream)
+
+            yield batch